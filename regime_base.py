@@ -0,0 +1,672 @@
+from AlgorithmImports import *
+import math
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from bisect import bisect_left, insort
+from collections import deque
+
+# Regime tiers as integer codes, ordered by risk; they index the per-regime tables
+CALM, ALERT, STRESS, PANIC = range(4)
+
+# Regime proposed by each UpdateSignals trigger bitmask
+# (bit 0 panic, 1 stress, 2 alert, 3 calm re-entry); -1 = no trigger, hold
+_REGIME_BY_MASK = tuple(
+    PANIC if m & 1 else STRESS if m & 2 else ALERT if m & 4 else CALM if m & 8 else -1
+    for m in range(16)
+)
+
+# Realized-vol lookback (days); the seed series and the incremental sums share it
+YZ_WINDOW = 20
+
+# Daily warmup bars; SeedCloseAndVolWindows stops where they begin
+WARMUP_BARS = 250
+
+
+def _yang_zhang_k(window):
+    # Yang-Zhang open-to-close weight that minimizes estimator variance for a window
+    return 0.34 / (1.34 + (window + 1.0) / (window - 1.0))
+
+
+def _seed_vol_window(overnight, open_close, rs, window=YZ_WINDOW):
+    """
+    Rolling `window`-day Yang-Zhang vol (annualized, in %) from per-bar
+    overnight / open-to-close / Rogers-Satchell terms, one reduction per
+    term over zero-copy sliding window views.
+    """
+    if len(overnight) < window:
+        return np.empty(0)
+    k = _yang_zhang_k(window)
+
+    var_o = sliding_window_view(overnight, window).var(axis=1, ddof=1)
+    var_c = sliding_window_view(open_close, window).var(axis=1, ddof=1)
+    mean_rs = sliding_window_view(rs, window).mean(axis=1)
+
+    var = var_o + k * var_c + (1.0 - k) * mean_rs
+    return np.sqrt(np.maximum(var, 0.0)) * (math.sqrt(252.0) * 100.0)
+
+
+class RingBuffer:
+    """
+    Fixed-capacity float64 ring buffer. Every value is written twice (at i and
+    i + cap), so the window is always one contiguous slice: as_array() is a
+    zero-copy view, oldest -> newest. `count` (values held) is a plain int
+    attribute rather than __len__ so hot paths can read it without a call.
+    """
+
+    __slots__ = ("_buf", "_i", "_cap", "count")
+
+    def __init__(self, cap):
+        self._buf = np.zeros(2 * cap, dtype=np.float64)
+        self._i = 0  # next write slot in [0, cap)
+        self.count = 0  # values held
+        self._cap = cap
+
+    def __len__(self):
+        return self.count
+
+    def push(self, x):
+        i = self._i
+        self._buf[i] = x
+        self._buf[i + self._cap] = x
+        self._i = i + 1 if i + 1 < self._cap else 0
+        if self.count < self._cap:
+            self.count += 1
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=np.float64)[-self._cap:]
+        idx = (self._i + np.arange(len(values))) % self._cap
+        self._buf[idx] = values
+        self._buf[idx + self._cap] = values
+        self._i = (self._i + len(values)) % self._cap
+        self.count = min(self.count + len(values), self._cap)
+
+    def last(self):
+        return self._buf[self._i + self._cap - 1]
+
+    def ago(self, k):
+        # k pushes before the newest (ago(0) == last()); needs k < len(self)
+        return self._buf[self._i + self._cap - 1 - k]
+
+    def oldest(self):
+        return self._buf[self._i if self.count == self._cap else 0]
+
+    def as_array(self):
+        end = self._i + self._cap if self.count == self._cap else self._i
+        return self._buf[end - self.count:end]
+
+
+class RollingMedian:
+    """
+    Fixed-length window with an O(log N) median:
+    a sorted copy of the window plus a RingBuffer of insertion order for eviction.
+    """
+
+    def __init__(self, maxlen):
+        self.maxlen = maxlen
+        self.values = RingBuffer(maxlen)
+        self.sorted = []
+
+    def __len__(self):
+        return self.values.count
+
+    def append(self, x):
+        if self.values.count == self.maxlen:
+            old = float(self.values.oldest())
+            del self.sorted[bisect_left(self.sorted, old)]
+        insort(self.sorted, x)
+        self.values.push(x)
+
+    def extend(self, xs):
+        xs = [float(x) for x in xs]
+        if self.values.count + len(xs) <= self.maxlen:
+            # Nothing to evict: one sort beats len(xs) insorts
+            self.sorted.extend(xs)
+            self.sorted.sort()
+            self.values.extend(xs)
+            return
+        for x in xs:
+            self.append(x)
+
+    def median(self):
+        n = len(self.sorted)
+        mid = n // 2
+        if n % 2:
+            return self.sorted[mid]
+        return 0.5 * (self.sorted[mid - 1] + self.sorted[mid])
+
+
+class RollingSums:
+    """
+    Fixed-length window with a running sum and sum of squares
+    (Kahan-compensated so years of add/evict don't drift): O(1) mean/variance.
+    """
+
+    def __init__(self, maxlen):
+        self.window = deque(maxlen=maxlen)
+        self.maxlen = maxlen
+        self.count = 0  # values held (saturates at maxlen)
+        self.sum = 0.0
+        self.sumsq = 0.0
+        self._sum_c = 0.0
+        self._sumsq_c = 0.0
+
+    def __len__(self):
+        return self.count
+
+    def push(self, x):
+        if self.count == self.maxlen:
+            old = self.window[0]
+            self._add(-old, -old * old)
+        else:
+            self.count += 1
+        self.window.append(x)
+        self._add(x, x * x)
+
+    def _add(self, x, x2):
+        y = x - self._sum_c
+        t = self.sum + y
+        self._sum_c = (t - self.sum) - y
+        self.sum = t
+
+        y = x2 - self._sumsq_c
+        t = self.sumsq + y
+        self._sumsq_c = (t - self.sumsq) - y
+        self.sumsq = t
+
+    def mean(self):
+        return self.sum / self.count
+
+    def var(self):
+        n = self.count
+        return max((self.sumsq - self.sum * self.sum / n) / (n - 1), 0.0)
+
+
+class RegimeBase(QCAlgorithm):
+    """
+    SPY regime risk-budget allocator over SPY/TLT/GLD.
+
+    Each strategy is a subclass that overrides the class-level parameters
+    below, sets its backtest window and cash in Initialize and then calls
+    InitializeRegime().
+    """
+
+    # -----------------------------
+    # Leverage (IG proxy: 1:20)
+    # -----------------------------
+    leverage = 20.0
+
+    # -----------------------------
+    # Base margin deployment by regime, indexed by regime code: Calm, Alert, Stress, Panic
+    # (Risk-off = deploy less, allow cash)
+    # -----------------------------
+    margin_budget_by_regime = (0.12, 0.09, 0.06, 0.04)
+
+    # Recovery participation floor (Calm only)
+    calm_min_effective_margin_pct = 0.07
+
+    # -----------------------------
+    # Structural weights by regime
+    # NOTE: bonds/gold remain the same; SPY reduces and the remainder becomes cash.
+    # -----------------------------
+    weights = (
+        {"spy": 0.55, "tlt": 0.35, "gld": 0.10},  # Calm
+        {"spy": 0.45, "tlt": 0.35, "gld": 0.10},  # Alert
+        {"spy": 0.30, "tlt": 0.35, "gld": 0.10},  # Stress
+        {"spy": 0.20, "tlt": 0.30, "gld": 0.10}   # Panic
+    )
+
+    # -----------------------------
+    # Drawdown governor: scale margin down from dd_buffer to min_risk_scale at dd_target
+    # (off = hard regime ceilings only)
+    # -----------------------------
+    use_drawdown_governor = False
+    dd_buffer = 0.12
+    dd_target = 0.25
+    min_risk_scale = 0.20
+
+    # Friday rebalance with change gating; off = rebalance only when the regime changes
+    weekly_rebalance = True
+
+    # Monthly cash contribution (0 = none)
+    dca_amount = 0
+
+    def InitializeRegime(self):
+        # -----------------------------
+        # Assets
+        # -----------------------------
+        self.spy = self.AddEquity("SPY", Resolution.Daily).Symbol
+        self.tlt = self.AddEquity("TLT", Resolution.Daily).Symbol
+        self.gld = self.AddEquity("GLD", Resolution.Daily).Symbol
+
+        self.SetBrokerageModel(BrokerageName.InteractiveBrokersBrokerage, AccountType.Margin)
+
+        for sym in [self.spy, self.tlt, self.gld]:
+            self.Securities[sym].SetLeverage(self.leverage)
+
+        # Per-regime (spy, tlt, gld) weight * leverage, aligned with self._symbols
+        self._symbols = (self.spy, self.tlt, self.gld)
+        self._regime_scaled = tuple(
+            (d["spy"] * self.leverage, d["tlt"] * self.leverage, d["gld"] * self.leverage)
+            for d in self.weights
+        )
+
+        # Drawdown state (peak / dd only updated with use_drawdown_governor)
+        self.peak_equity = None
+        self.current_equity = 0.0  # refreshed by UpdateSignals
+        self.current_dd = 0.0
+
+        # -----------------------------
+        # Indicators (SPY drives regime)
+        # -----------------------------
+        self.sma50  = self.SMA(self.spy, 50, Resolution.Daily)
+        self.sma200 = self.SMA(self.spy, 200, Resolution.Daily)
+        self.rsi    = self.RSI(self.spy, 14, MovingAverageType.Wilders, Resolution.Daily)
+
+        self.close_window = RingBuffer(252)
+        self.vol_window   = RollingMedian(252)  # for volatility normalization
+        self.days_below_sma50 = 0
+
+        # Rolling YZ_WINDOW-day Yang-Zhang components: overnight, open->close, Rogers-Satchell
+        self.yz_overnight = RollingSums(YZ_WINDOW)
+        self.yz_open_close = RollingSums(YZ_WINDOW)
+        self.yz_rs = RollingSums(YZ_WINDOW)
+        self._yz_k = _yang_zhang_k(YZ_WINDOW)
+        self._vol_scale = math.sqrt(252) * 100.0  # daily std -> annualized %
+
+        # Regime state
+        self.regime = CALM
+
+        # Date and SPY close of the last UpdateSignals pass (repeat calls that day are no-ops)
+        self._last_signal_bar = None
+        self._signal_close = 0.0
+
+        # Charting (off in live mode or with parameter enable_plots=0)
+        self._plots_enabled = not self.LiveMode and self.GetParameter("enable_plots", "1") == "1"
+        self._last_series_plot = datetime.min    # last ~5 day Regime sample
+        self._last_drawdown_plot = datetime.min  # last ~5 day Risk/Drawdown sample
+        self._last_plotted = {}  # (chart, series) -> last value sent, for PlotIfChanged
+
+        # EndTime of the newest bar in close_window (seeded or pushed)
+        self._last_bar_end = None
+
+        # Warmup + seed history (the seed ends where warmup begins; warmup bars then
+        # flow through UpdateSignals so regime state is current on the start date)
+        self.SetWarmup(WARMUP_BARS, Resolution.Daily)
+        self.SeedCloseAndVolWindows()
+
+        # Rebalance control (week key = whole weeks since a fixed Monday; monotonic across years)
+        self._epoch_monday = datetime(2000, 1, 3)
+        self.last_rebalance_week = -1
+        self.last_regime = self.regime
+        self.last_effective_pct = None
+        self.last_spy_weight_multiplier = None
+        self._dca_pending = False
+
+        # Scheduling
+        self.Schedule.On(
+            self.DateRules.EveryDay(self.spy),
+            self.TimeRules.BeforeMarketClose(self.spy, 10),
+            self.UpdateSignals
+        )
+
+        if self.weekly_rebalance:
+            self.Schedule.On(
+                self.DateRules.Every(DayOfWeek.Friday),
+                self.TimeRules.BeforeMarketClose(self.spy, 5),
+                self.WeeklyRebalance
+            )
+
+        if self.dca_amount:
+            self.Schedule.On(
+                self.DateRules.MonthStart(self.spy),
+                self.TimeRules.AfterMarketOpen(self.spy, 5),
+                self.AddMonthlyDCA
+            )
+
+    # -----------------------------
+    # Seed close + vol windows
+    # -----------------------------
+    def SeedCloseAndVolWindows(self):
+        hist = self.History(self.spy, 252 + WARMUP_BARS, Resolution.Daily)
+        if hist.empty:
+            return
+
+        try:
+            bars = hist.xs(self.spy, level=0)
+        except Exception:
+            bars = hist
+
+        # The newest WARMUP_BARS bars are replayed by warmup; seeding them too would push them twice
+        bars = bars.iloc[:-WARMUP_BARS]
+        if bars.empty:
+            return
+
+        # One float64 block for all four columns; drop any bar with a non-positive price
+        ohlc = bars[["open", "high", "low", "close"]].to_numpy(dtype=np.float64)[-252:]
+        valid = (ohlc > 0).all(axis=1)
+        ohlc = ohlc[valid]
+        opens, highs, lows, closes = ohlc.T
+
+        self.close_window.extend(closes)
+
+        # History is indexed by bar end time; UpdateSignals skips bars not newer than this
+        if valid.any():
+            self._last_bar_end = bars.index[-252:][valid][-1].to_pydatetime()
+
+        # Seed the Yang-Zhang sums and vol_window (rolling YZ_WINDOW-day vol across the seeded bars)
+        if len(closes) >= YZ_WINDOW + 1:
+            # Per-bar Yang-Zhang terms (bar t needs close t-1)
+            o, h, l, c = opens[1:], highs[1:], lows[1:], closes[1:]
+            overnight = np.log(o / closes[:-1])
+            co = np.log(c / o)
+            ho = np.log(h / o)
+            lo = np.log(l / o)
+            rs = ho * (ho - co) + lo * (lo - co)
+
+            n = YZ_WINDOW
+            for x_o, x_c, x_rs in zip(overnight[-n:].tolist(), co[-n:].tolist(), rs[-n:].tolist()):
+                self.yz_overnight.push(x_o)
+                self.yz_open_close.push(x_c)
+                self.yz_rs.push(x_rs)
+
+            self.vol_window.extend(_seed_vol_window(overnight, co, rs).tolist())
+
+    # -----------------------------
+    # Update signals (+ drawdown tracking with the governor)
+    # -----------------------------
+    def UpdateSignals(self):
+        # Runs through warmup too, so the windows, days_below_sma50 and the regime are
+        # current on the start date; warmup only suppresses plots and orders
+        warming_up = self.IsWarmingUp
+        plots_enabled = self._plots_enabled and not warming_up
+
+        # One pass per trading day: a second call the same day would push
+        # the same bar into the windows twice
+        today = self.Time.date()
+        if self._last_signal_bar == today:
+            return
+        self._last_signal_bar = today
+
+        # Maintain close window (+ running Yang-Zhang sums from the latest daily bar).
+        # Only a bar newer than the last one pushed/seeded counts, so a stale call
+        # (the engine still holding the previous bar) can't push it twice.
+        bar = self.Securities[self.spy]
+        close = float(bar.Close)
+        self._signal_close = close
+        last_data = bar.GetLastData()
+        bar_end = last_data.EndTime if last_data is not None else None
+        fresh = bar_end is None or self._last_bar_end is None or bar_end > self._last_bar_end
+        if fresh:
+            if bar_end is not None:
+                self._last_bar_end = bar_end
+            close_window = self.close_window
+            if close > 0:
+                if close_window.count:
+                    self.PushYangZhangTerms(float(bar.Open), float(bar.High), float(bar.Low), close,
+                                            float(close_window.last()))
+                close_window.push(close)
+
+        # Track equity (+ peak / drawdown for the governor)
+        equity = float(self.Portfolio.TotalPortfolioValue)
+        self.current_equity = equity
+        if self.use_drawdown_governor:
+            peak = self.peak_equity
+            if peak is None or equity > peak:
+                peak = self.peak_equity = equity
+
+            current_dd = 0.0 if peak <= 0 else 1.0 - (equity / peak)
+            self.current_dd = current_dd
+            # Sampled every ~5 days without the change filter: drawdown sits at exactly 0 through
+            # new highs, and skipped points would draw a diagonal across those flat runs
+            if plots_enabled and (self.Time - self._last_drawdown_plot).days >= 5:
+                self._last_drawdown_plot = self.Time
+                self.Plot("Risk", "Drawdown", current_dd)
+
+        # A stale bar adds no information; re-classifying would double-count it
+        # (days_below_sma50, vol_window)
+        if not fresh:
+            return
+
+        # Regime classification needs indicators ready
+        if not (self.sma50.IsReady and self.sma200.IsReady and self.rsi.IsReady):
+            return
+
+        # Read each indicator once; .Current.Value is a round-trip into the engine
+        sma50 = float(self.sma50.Current.Value)
+        rsi = float(self.rsi.Current.Value)
+
+        # Persistence below 50-DMA
+        days_below = self.days_below_sma50 + 1 if close < sma50 else 0
+        self.days_below_sma50 = days_below
+
+        rv20 = self.RealizedVol20()
+        dd20 = self.ReturnNDays(20)
+
+        if rv20 is None or dd20 is None:
+            return
+
+        # Update vol normalization window
+        vol_window = self.vol_window
+        vol_window.append(rv20)
+
+        # Normalized volatility ratio vs trailing median (robust to changing vol regimes)
+        median_vol = vol_window.median() if vol_window.values.count >= 100 else rv20
+        if median_vol <= 0:
+            median_vol = rv20
+
+        vol_ratio = rv20 / median_vol
+
+        regime = self.regime
+
+        # Trigger bitmask -> proposed regime (riskiest trigger wins; no trigger holds)
+        mask = (
+            (vol_ratio > 1.60 or dd20 <= -0.08)
+            | (vol_ratio >= 1.40 and days_below >= 4 and rsi < 40) << 1
+            | (vol_ratio >= 1.25 and days_below >= 2 and rsi < 45) << 2
+            | (vol_ratio < 1.15 and close >= sma50 and rsi > 50) << 3
+        )
+        new_regime = _REGIME_BY_MASK[mask]
+        if new_regime < 0:
+            new_regime = regime
+
+        # Allow fast de-risking, slow re-risking
+        self.regime = self.ClampTier(regime, new_regime)
+
+        # Plots for intuition/debugging: Stage on every change plus a ~5 day sample
+        # (keeps the step chart flat between changes), vol series only when they move.
+        # The sample clock only advances here, so stale or not-ready days don't eat a sample.
+        plot_series = plots_enabled and (self.Time - self._last_series_plot).days >= 5
+        if plot_series:
+            self._last_series_plot = self.Time
+        if plot_series or (plots_enabled and self.regime != regime):
+            self.Plot("Regime", "Stage", self.regime)
+        if plot_series:
+            self.PlotIfChanged("Regime", "Vol20", rv20, 0.01)
+            self.PlotIfChanged("Regime", "VolRatio", vol_ratio, 1e-4)
+
+        if self.regime != regime and not warming_up:
+            self.OnRegimeChange(regime)
+
+    def OnRegimeChange(self, previous):
+        """Called from UpdateSignals after self.regime moved away from `previous`."""
+        # Without the weekly schedule, a regime change is the only rebalance trigger
+        if not self.weekly_rebalance:
+            self.Rebalance()
+
+    def OnWarmupFinished(self):
+        # The regime is already classified from warmup; without the weekly schedule,
+        # take the initial position now rather than waiting for the next change
+        if not self.weekly_rebalance:
+            self.Rebalance()
+
+    # -----------------------------
+    # Monthly DCA (cash only)
+    # -----------------------------
+    def AddMonthlyDCA(self):
+        self.Portfolio.CashBook["USD"].AddAmount(self.dca_amount)
+        # New cash changes every holding's fraction; force the next rebalance through
+        self._dca_pending = True
+
+    # Friday schedule entry: warmup + once-per-week guards, then Rebalance
+    def WeeklyRebalance(self):
+        # Orders are rejected during warmup; don't record rebalance state for them
+        if self.IsWarmingUp:
+            return
+
+        # Signals come from the daily UpdateSignals, scheduled 5 minutes earlier
+        week = (self.Time - self._epoch_monday).days // 7
+        if week == self.last_rebalance_week:
+            return
+        self.last_rebalance_week = week
+
+        self.Rebalance()
+
+    # -----------------------------
+    # Rebalance (long-only), regime budgets + drawdown governor + Calm floor
+    # Plus: (1) late-cycle Calm brake that reduces SPY only, (2) conditional rebalance gating
+    # -----------------------------
+    def Rebalance(self):
+        # Equity is refreshed by the daily UpdateSignals; targets are equity-relative so only guard it
+        if self.current_equity <= 0:
+            return
+
+        regime = self.regime
+        base_pct = self.margin_budget_by_regime[regime]
+        risk_scale = self.RiskScaleFromDrawdown() if self.use_drawdown_governor else 1.0
+
+        # Effective margin percentage after drawdown scaling
+        effective_pct = base_pct * risk_scale
+
+        # Recovery participation floor (Calm only)
+        if regime == CALM:
+            effective_pct = max(effective_pct, self.calm_min_effective_margin_pct)
+            effective_pct = min(effective_pct, base_pct)
+
+        # Late-cycle Calm brake (reduce SPY only; bonds/gold unchanged; remainder becomes cash)
+        # "Extended Calm" defined as SPY meaningfully above long trend; SMA200 is only read in Calm.
+        extended_calm = False
+        if regime == CALM:
+            close = self._signal_close  # same daily bar UpdateSignals read
+            sma200 = float(self.sma200.Current.Value) if self.sma200.IsReady else close
+            extended_calm = sma200 > 0 and close > 1.05 * sma200
+
+        spy_weight_multiplier = 0.85 if extended_calm else 1.0
+
+        # Conditional rebalance gating:
+        # Only rebalance if regime changed OR effective risk changed materially OR Calm-brake toggled
+        # OR a DCA deposit landed since the last rebalance.
+        effective_changed = (
+            self.last_effective_pct is None or
+            abs(effective_pct - self.last_effective_pct) >= 0.01  # 1% of equity margin deployment
+        )
+        regime_changed = (regime != self.last_regime)
+        spy_mult_changed = (
+            self.last_spy_weight_multiplier is None or
+            abs(spy_weight_multiplier - self.last_spy_weight_multiplier) > 1e-9
+        )
+
+        if not (regime_changed or effective_changed or spy_mult_changed or self._dca_pending):
+            return
+
+        # Plots for debugging/intuition
+        if self._plots_enabled:
+            if self.use_drawdown_governor:
+                self.Plot("Risk", "RiskScale", risk_scale)
+            self.Plot("Risk", "EffectiveMarginPct", effective_pct * 100)
+            self.Plot("Risk", "ExtendedCalm", 1 if extended_calm else 0)
+
+        self.SetRegimeTargets(effective_pct, spy_weight_multiplier)
+
+        # Update state
+        self.last_regime = regime
+        self.last_effective_pct = effective_pct
+        self.last_spy_weight_multiplier = spy_weight_multiplier
+        self._dca_pending = False
+
+    # -----------------------------
+    # Drawdown governor: scale risk as DD rises between dd_buffer and dd_target
+    # -----------------------------
+    def RiskScaleFromDrawdown(self) -> float:
+        dd = self.current_dd
+
+        if dd <= self.dd_buffer:
+            return 1.0
+
+        if dd >= self.dd_target:
+            return self.min_risk_scale
+
+        span = self.dd_target - self.dd_buffer
+        if span <= 0:
+            return self.min_risk_scale
+
+        t = (dd - self.dd_buffer) / span  # 0..1
+        scale = 1.0 - t * (1.0 - self.min_risk_scale)
+        return max(self.min_risk_scale, min(1.0, scale))
+
+    # -----------------------------
+    # Helpers
+    # -----------------------------
+    def PlotIfChanged(self, chart, series, value, eps):
+        # Skip the Plot call when the series hasn't moved more than eps since its last point
+        key = (chart, series)
+        last = self._last_plotted.get(key)
+        if last is not None and abs(value - last) <= eps:
+            return
+        self._last_plotted[key] = value
+        self.Plot(chart, series, value)
+
+    def SetRegimeTargets(self, effective_pct, spy_weight_multiplier):
+        # Target fraction = weight * (equity * effective_pct) * leverage / equity
+        #                 = weight * effective_pct * leverage  (equity cancels)
+        # Late-cycle brake applies to SPY only (bonds/gold weights unchanged; freed risk is cash)
+        spy_f, tlt_f, gld_f = self._regime_scaled[self.regime]
+        spy, tlt, gld = self._symbols
+        self.SetHoldings([
+            PortfolioTarget(spy, spy_f * spy_weight_multiplier * effective_pct),
+            PortfolioTarget(tlt, tlt_f * effective_pct),
+            PortfolioTarget(gld, gld_f * effective_pct)
+        ], True)
+
+    def PushYangZhangTerms(self, o, h, l, c, prev_close):
+        if o <= 0 or h <= 0 or l <= 0:
+            return
+        ho = math.log(h / o)
+        lo = math.log(l / o)
+        co = math.log(c / o)
+        self.yz_overnight.push(math.log(o / prev_close))
+        self.yz_open_close.push(co)
+        # Rogers-Satchell: ln(H/C)ln(H/O) + ln(L/C)ln(L/O), with ln(X/C) = ln(X/O) - ln(C/O)
+        self.yz_rs.push(ho * (ho - co) + lo * (lo - co))
+
+    def RealizedVol20(self):
+        if self.yz_rs.count < YZ_WINDOW:
+            return None
+        k = self._yz_k
+        var = self.yz_overnight.var() + k * self.yz_open_close.var() + (1.0 - k) * self.yz_rs.mean()
+        return math.sqrt(max(var, 0.0)) * self._vol_scale
+
+    def ReturnNDays(self, n):
+        close_window = self.close_window
+        if close_window.count < n + 1:
+            return None
+        # Two scalar reads; no window slice
+        first = float(close_window.ago(n))
+        if first <= 0:
+            return None
+        return float(close_window.last()) / first - 1.0
+
+    def ClampTier(self, current, proposed):
+        """
+        Tiers are regime codes, CALM=0 .. PANIC=3:
+        - Allow fast de-risking (move to higher-risk tier immediately).
+        - Slow re-risking (only step up one tier at a time on improvement).
+        """
+        # Fast de-risking
+        if proposed > current:
+            return proposed
+
+        # Slow re-risking (no multi-tier jumps back to Calm)
+        if proposed < current - 1:
+            return current - 1
+
+        return proposed